@@ -0,0 +1,92 @@
+"""
+Optional io_uring reader used to batch open/read/close of small files.
+
+Requires Linux and the ``liburing`` package; importing this module raises
+ImportError otherwise.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import liburing
+
+
+QUEUE_DEPTH = 256
+
+
+def _run(ring, cqe, preps: Sequence[Tuple[Callable, tuple]]) -> List[Optional[int]]:
+    """Submit one SQE per (prep, args) and reap all completions; failed ops yield None."""
+    if not preps:
+        return []
+    for i, (prep, args) in enumerate(preps):
+        sqe = liburing.io_uring_get_sqe(ring)
+        prep(sqe, *args)
+        sqe.user_data = i
+    liburing.io_uring_submit_and_wait(ring, len(preps))
+
+    results: List[Optional[int]] = [None] * len(preps)
+    for _ in range(len(preps)):
+        liburing.io_uring_wait_cqe(ring, cqe)
+        entry = cqe[0]
+        i = entry.user_data
+        try:
+            results[i] = entry.res  # raises on a negative result
+        except OSError:
+            pass
+        finally:
+            liburing.io_uring_cqe_seen(ring, entry)
+    return results
+
+
+def _is_utf8(path: str) -> bool:
+    try:
+        path.encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def read_files(files: Sequence[Tuple[str, int]]) -> List[Optional[bytes]]:
+    """
+    Read each (path, expected_size) file whole, submitting the opens, reads
+    and closes for up to QUEUE_DEPTH files at a time. An entry is None if the
+    file could not be read or grew beyond expected_size; callers should fall
+    back to the regular read path for those.
+    """
+    out: List[Optional[bytes]] = [None] * len(files)
+    ring = liburing.Ring()
+    cqe = liburing.Cqe()
+    liburing.io_uring_queue_init(QUEUE_DEPTH, ring)
+    try:
+        for start in range(0, len(files), QUEUE_DEPTH):
+            batch = files[start:start + QUEUE_DEPTH]
+            flags = os.O_RDONLY | os.O_CLOEXEC
+            # liburing takes paths only as str and encodes them as strict UTF-8, so names that
+            # are not valid UTF-8 are left as None for the caller's regular read path
+            named = [i for i, (path, _) in enumerate(batch) if _is_utf8(path)]
+            fds = dict(zip(named, _run(ring, cqe, [(liburing.io_uring_prep_open, (batch[i][0], flags))
+                                                   for i in named])))
+
+            # one extra byte so a file that grew since stat() is detected
+            bufs = {i: bytearray(batch[i][1] + 1) for i in named if fds[i] is not None}
+            opened = sorted(bufs)
+            try:
+                lengths = _run(ring, cqe, [(liburing.io_uring_prep_read, (fds[i], bufs[i])) for i in opened])
+            except BaseException:
+                # don't leak the descriptors; close them synchronously since the ring may be unusable
+                for i in opened:
+                    try:
+                        os.close(fds[i])
+                    except OSError:
+                        pass
+                raise
+            _run(ring, cqe, [(liburing.io_uring_prep_close, (fds[i],)) for i in opened])
+
+            for i, n in zip(opened, lengths):
+                if n is not None and n <= batch[i][1]:
+                    out[start + i] = bytes(bufs[i][:n])
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return out
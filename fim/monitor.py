@@ -5,147 +5,840 @@ Core scanning and baseline logic for the File Integrity Monitor.
 from __future__ import annotations
 
 import fnmatch
+import functools
 import hashlib
 import json
 import logging
 import os
+import re
+import sqlite3
 import stat
+import struct
 import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Union
+
+try:  # optional: pip install blake3
+    import blake3
+except ImportError:  # pragma: no cover - depends on environment
+    blake3 = None
+
+try:  # optional: pip install orjson
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+try:  # optional, Linux only: pip install liburing
+    from . import _io_uring
+except ImportError:  # pragma: no cover - depends on environment
+    _io_uring = None
+
+try:  # optional: pip install numpy
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on environment
+    np = None
+
+try:  # optional: pip install msgpack
+    import msgpack
+except ImportError:  # pragma: no cover - depends on environment
+    msgpack = None
 
 
 CHUNK_SIZE = 1024 * 1024  # 1MB
+LARGE_FILE_SIZE = 8 * 1024 * 1024  # files at least this large are read in CHUNK_SIZE pieces
+SMALL_FILE_SIZE = 64 * 1024  # files below this are hashed in batches
+SMALL_FILE_BATCH = 32
+CACHE_TTL = 24 * 60 * 60  # seconds a hash cache entry survives without being seen
+CACHE_MAX_ENTRIES = 1_000_000
+CACHE_FLUSH_ENTRIES = 10_000  # pending cache writes that trigger a flush, bounding memory on large trees
+MIGRATED_MTIME_TOLERANCE_NS = 1000  # float-second mtimes of old baselines are only accurate to ~0.25 us
+NUMBA_MIN_ROWS = 100_000  # below this the JIT's first-call compile cost outweighs the speedup
+
+
+# Constructors bound once, instead of hashlib.new()'s name lookup per file.
+_HASHERS = {
+    "sha256": hashlib.sha256,
+    "sha1": hashlib.sha1,
+    "sha512": hashlib.sha512,
+    "md5": hashlib.md5,
+}
+if blake3 is not None:
+    _HASHERS["blake3"] = blake3.blake3
+
+
+def _new_hasher(algorithm: str):
+    ctor = _HASHERS.get(algorithm)
+    if ctor is not None:
+        return ctor()
+    try:
+        return hashlib.new(algorithm)
+    except Exception as e:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}") from e
+
+
+def sha_extensions_available() -> Optional[bool]:
+    """
+    Whether the CPU advertises SHA-2 instructions (x86 SHA-NI, ARMv8 sha2),
+    from /proc/cpuinfo. None when this cannot be determined.
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            cpuinfo = f.read()
+    except OSError:
+        return None
+    for line in cpuinfo.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() in ("flags", "Features"):
+            flags = value.split()
+            return "sha_ni" in flags or "sha2" in flags
+    return None
+
+
+def recommend_algorithm(algorithm: str) -> Optional[str]:
+    """Suggest a faster algorithm for this machine, or None if algorithm is a fine choice."""
+    if algorithm in ("sha256", "sha224") and "blake3" in _HASHERS and sha_extensions_available() is False:
+        return "blake3"
+    return None
+
+
+def _default_workers() -> int:
+    # hashlib releases the GIL while hashing, so oversubscribe to overlap reads with hashing.
+    return (os.cpu_count() or 1) * 2
 
 
-def _is_hidden(path: Path) -> bool:
+def _is_hidden(path: str) -> bool:
     # Hidden if any part starts with '.' (Unix/Mac); Windows uses 'hidden' attribute but we keep simple.
-    return any(part.startswith('.') for part in path.parts)
+    if path.startswith('.') or (os.sep + '.') in path:
+        return True
+    return bool(os.altsep) and (os.altsep + '.') in path
+
+
+def _compile_excludes(patterns: List[str]) -> Optional[Pattern]:
+    """Fold all exclude globs into one compiled regex (None when there are none)."""
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.name == "nt" else 0  # fnmatch is case-insensitive on Windows
+    return re.compile("|".join(f"(?:{fnmatch.translate(os.path.normcase(pat))})" for pat in patterns), flags)
+
+
+def _resolve_roots(paths: Iterable[Path]) -> List[str]:
+    return [os.path.realpath(p) for p in paths]
+
+
+def _root_prefixes(roots: List[str]) -> List[str]:
+    # "<root>/" so relative paths come from a prefix check and a slice
+    return [root if root.endswith(os.sep) else root + os.sep for root in roots]
 
 
-def _should_exclude(path: Path, patterns: List[str], roots: List[Path]) -> bool:
+def _outermost_roots(roots: List[str]) -> List[str]:
+    """Drop roots that repeat or lie inside another root; walking the outer one reaches them anyway."""
+    prefixes = _root_prefixes(roots)
+    out: List[str] = []
+    for root in roots:
+        if root not in out and not any(root.startswith(prefix) for prefix in prefixes):
+            out.append(root)
+    return out
+
+
+def _should_exclude(path: str, name: str, excl_re: Optional[Pattern], prefixes: List[str]) -> bool:
     """
     Check exclude patterns against:
       - the absolute path
       - the basename
       - the path relative to each root (if possible)
     """
-    if not patterns:
+    if excl_re is None:
         return False
 
-    s_abs = str(path)
-    base = path.name
+    if excl_re.match(name) or excl_re.match(path):
+        return True
 
-    def match_any(s: str) -> bool:
-        return any(fnmatch.fnmatch(s, pat) for pat in patterns)
+    for prefix in prefixes:
+        if path.startswith(prefix) and excl_re.match(path[len(prefix):]):
+            return True
+    return False
 
-    if match_any(base) or match_any(s_abs):
-        return True
 
-    for root in roots:
+_EUID = os.geteuid() if hasattr(os, "geteuid") else None
+
+
+def _open_readonly(filepath, st: Optional[os.stat_result] = None) -> int:
+    # O_NOATIME avoids an atime write per file but is only permitted for the file owner;
+    # with a stat at hand, skip the attempt that would fail for files we do not own.
+    noatime = getattr(os, "O_NOATIME", 0)
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    if noatime and (st is None or _EUID == 0 or st.st_uid == _EUID):
         try:
-            rel = str(path.relative_to(root))
-            if match_any(rel):
-                return True
-        except ValueError:
-            continue
-    return False
+            return os.open(filepath, flags | noatime)
+        except PermissionError:
+            pass
+    return os.open(filepath, flags)
+
+
+def _hash_blake3(filepath: Path, st: Optional[os.stat_result] = None) -> str:
+    if blake3 is None:
+        raise ValueError("Unsupported hash algorithm: blake3 (install the 'blake3' package)")
+    # update_mmap is not used: a file truncated while mapped raises SIGBUS and kills the process
+    h = blake3.blake3(max_threads=blake3.blake3.AUTO)
+    with open(_open_readonly(filepath, st), "rb", buffering=0) as f:
+        _hash_readinto(f, h)
+    return h.hexdigest()
 
 
-def hash_file(filepath: Path, algorithm: str = "sha256") -> str:
-    try:
-        h = hashlib.new(algorithm)
-    except Exception as e:
-        raise ValueError(f"Unsupported hash algorithm: {algorithm}") from e
+def _hash_readinto(f, h) -> None:
+    """Feed the rest of f to h through one reusable CHUNK_SIZE buffer."""
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        h.update(view[:n])
 
-    with open(filepath, "rb") as f:
-        while True:
-            chunk = f.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            h.update(chunk)
+
+def hash_bytes(data: bytes, algorithm: str = "sha256") -> str:
+    if algorithm == "blake3" and blake3 is None:
+        raise ValueError("Unsupported hash algorithm: blake3 (install the 'blake3' package)")
+    h = _new_hasher(algorithm)
+    h.update(data)
+    return h.hexdigest()
+
+
+def hash_file(filepath: Path, algorithm: str = "sha256", st: Optional[os.stat_result] = None) -> str:
+    """
+    Hash a file's contents. st, if the caller already has it, saves an fstat()
+    and lets the O_NOATIME decision be made without a failing open().
+    """
+    if algorithm == "blake3":
+        return _hash_blake3(filepath, st)
+    h = _new_hasher(algorithm)
+
+    with open(_open_readonly(filepath, st), "rb", buffering=0) as f:
+        size = st.st_size if st is not None else os.fstat(f.fileno()).st_size
+        if size < LARGE_FILE_SIZE and hasattr(hashlib, "file_digest"):
+            # Python 3.11+: reads into one reusable buffer instead of allocating bytes per chunk
+            return hashlib.file_digest(f, lambda: h).hexdigest()
+        if size >= LARGE_FILE_SIZE and hasattr(os, "posix_fadvise"):
+            # ask for aggressive readahead; unlike mmap this is safe if the file shrinks meanwhile
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        # large files (and Python < 3.11): same loop with a bigger buffer than file_digest's 256 KiB
+        _hash_readinto(f, h)
     return h.hexdigest()
 
 
 @dataclass
 class FileInfo:
-    hash: str
+    hash: Optional[str]  # None only in one-off scan states (see build_incremental)
     size: int
-    mtime: float
+    mtime_ns: int
     mode: Optional[int] = None  # permission bits
+    # identify the inode version, so an unchanged (size, mtime) alone does not vouch for the content
+    ino: Optional[int] = None
+    ctime_ns: Optional[int] = None
 
     @classmethod
-    def from_path(cls, p: Path, algorithm: str, track_perms: bool = False) -> "FileInfo":
-        st = p.stat()
-        file_hash = hash_file(p, algorithm)
+    def from_stat(cls, st: os.stat_result, file_hash: Optional[str], track_perms: bool = False) -> "FileInfo":
         mode = stat.S_IMODE(st.st_mode) if track_perms else None
-        return cls(hash=file_hash, size=st.st_size, mtime=st.st_mtime, mode=mode)
+        return cls(hash=file_hash, size=st.st_size, mtime_ns=st.st_mtime_ns, mode=mode, ino=st.st_ino,
+                   ctime_ns=st.st_ctime_ns)
 
+    @classmethod
+    def from_path(cls, p: Union[str, Path, os.DirEntry], algorithm: str, track_perms: bool = False,
+                  st: Optional[os.stat_result] = None, file_hash: Optional[str] = None) -> "FileInfo":
+        if st is None:
+            # DirEntry.stat() is cached on the entry, so reuse it when we have one
+            st = p.stat() if isinstance(p, os.DirEntry) else os.stat(p)
+        if file_hash is None:
+            file_hash = hash_file(p, algorithm, st=st)
+        return cls.from_stat(st, file_hash, track_perms=track_perms)
 
-def iter_files(paths: Iterable[Path], excludes: List[str], follow_symlinks: bool,
-               ignore_hidden: bool) -> Iterator[Path]:
-    roots = [p.resolve() for p in paths]
 
-    for root in roots:
-        if root.is_file():
-            if (not ignore_hidden or not _is_hidden(root)) and not _should_exclude(root, excludes, roots):
+class HashCache:
+    """
+    Persistent content-hash cache backed by SQLite, keyed by the algorithm and
+    (device, inode, size, mtime_ns, ctime_ns). A hit means the file has not
+    been written since it was hashed, so its hash is reused without reading it.
+    ctime is part of the key because, unlike mtime, it cannot be set back by
+    the file's owner.
+    """
+
+    def __init__(self, path: Path, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES,
+                 flush_entries: int = CACHE_FLUSH_ENTRIES):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_entries = flush_entries
+        self._db = sqlite3.connect(str(path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS hashes (key BLOB PRIMARY KEY, hash TEXT, last_seen INTEGER)")
+        self._pending: Dict[bytes, str] = {}
+
+    @staticmethod
+    def key(st: os.stat_result, algorithm: str) -> bytes:
+        return algorithm.encode() + b":" + struct.pack("<QQqqq", st.st_dev, st.st_ino, st.st_size,
+                                                       st.st_mtime_ns, st.st_ctime_ns)
+
+    def get(self, key: bytes) -> Optional[str]:
+        row = self._db.execute("SELECT hash FROM hashes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._pending[key] = row[0]  # refresh last_seen on flush
+        if len(self._pending) >= self.flush_entries:
+            self.flush()
+        return row[0]
+
+    def put(self, key: bytes, file_hash: str) -> None:
+        self._pending[key] = file_hash
+        if len(self._pending) >= self.flush_entries:
+            self.flush()
+
+    def flush(self) -> None:
+        now = int(time.time())
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO hashes (key, hash, last_seen) VALUES (?, ?, ?)",
+                                 [(k, h, now) for k, h in self._pending.items()])
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        with self._db:
+            self._db.execute("DELETE FROM hashes WHERE last_seen < ?", (int(time.time()) - self.ttl,))
+            self._db.execute("DELETE FROM hashes WHERE key NOT IN "
+                             "(SELECT key FROM hashes ORDER BY last_seen DESC LIMIT ?)", (self.max_entries,))
+        self._db.close()
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _iter_entries(roots: List[str], excl_re: Optional[Pattern], follow_symlinks: bool,
+                  ignore_hidden: bool) -> Iterator[Union[os.DirEntry, str]]:
+    """
+    Walk roots with os.scandir, yielding a DirEntry per regular file (or the
+    path string for a root that is itself a file). Type checks come from the
+    directory read, so no extra stat() is issued per file.
+    """
+    prefixes = _root_prefixes(roots)  # every root still counts for relative exclude patterns
+    for root in _outermost_roots(roots):
+        # a hidden root hides everything below it
+        if ignore_hidden and _is_hidden(root):
+            continue
+        if os.path.isfile(root):
+            if not _should_exclude(root, os.path.basename(root), excl_re, prefixes):
                 yield root
             continue
 
-        for dirpath, dirnames, filenames in os.walk(root, followlinks=follow_symlinks):
-            dpath = Path(dirpath)
+        stack = [root]
+        while stack:
+            try:
+                it = os.scandir(stack.pop())
+            except OSError:
+                # permission or race; skip
+                continue
+            with it:
+                for entry in it:
+                    if ignore_hidden and entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            stack.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if _should_exclude(entry.path, entry.name, excl_re, prefixes):
+                        continue
+                    yield entry
 
-            # filter hidden directories early if ignoring hidden
-            if ignore_hidden:
-                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
 
-            for fname in filenames:
-                fpath = dpath / fname
-                if ignore_hidden and _is_hidden(fpath):
-                    continue
-                if _should_exclude(fpath, excludes, roots):
+def iter_files(paths: Iterable[Path], excludes: List[str], follow_symlinks: bool,
+               ignore_hidden: bool) -> Iterator[str]:
+    roots = _resolve_roots(paths)
+    for entry in _iter_entries(roots, _compile_excludes(excludes), follow_symlinks, ignore_hidden):
+        yield os.fspath(entry)
+
+
+def _mtime_matches(a: Optional[int], b: Optional[int], approx: bool) -> bool:
+    """mtime_ns equality; with approx (an entry migrated from float seconds), to within a microsecond."""
+    if a == b:
+        return True
+    return approx and a is not None and b is not None and abs(a - b) < MIGRATED_MTIME_TOLERANCE_NS
+
+
+def _hash_batch(files: List[Tuple[str, os.stat_result]], algorithm: str,
+                track_perms: bool) -> List[Tuple[str, Dict]]:
+    contents: List[Optional[bytes]] = [None] * len(files)
+    if _io_uring is not None and len(files) > 1 and all(st.st_size < SMALL_FILE_SIZE for _, st in files):
+        try:
+            contents = _io_uring.read_files([(fpath, st.st_size) for fpath, st in files])
+        except Exception:
+            # io_uring unavailable (old kernel, seccomp) or failing; the regular read path still works
+            pass
+
+    out = []
+    for (fpath, st), data in zip(files, contents):
+        try:
+            file_hash = hash_bytes(data, algorithm) if data is not None else None
+            info = FileInfo.from_path(fpath, algorithm, track_perms=track_perms, st=st, file_hash=file_hash)
+        except (PermissionError, FileNotFoundError, OSError):
+            continue
+        out.append((fpath, asdict(info)))
+    return out
+
+
+def _batches(files: Iterable[Optional[Tuple[str, os.stat_result]]]) -> Iterator[List[Tuple[str, os.stat_result]]]:
+    """
+    Group files into work units: each large file is its own unit, small files
+    are packed SMALL_FILE_BATCH at a time so per-task overhead is amortized.
+    A None in files is passed on as an empty unit, giving the consumer a
+    chance to run even when nothing needs hashing.
+    """
+    small = []
+    for item in files:
+        if item is None:
+            yield []
+            continue
+        fpath, st = item
+        if st.st_size < SMALL_FILE_SIZE:
+            small.append((fpath, st))
+            if len(small) == SMALL_FILE_BATCH:
+                yield small
+                small = []
+        else:
+            yield [(fpath, st)]
+    if small:
+        yield small
+
+
+def _iter_state(paths: List[Path], excludes: List[str], algorithm: str, follow_symlinks: bool,
+                ignore_hidden: bool, track_perms: bool, workers: Optional[int], use_processes: bool,
+                prev: Optional[Dict[str, Dict]] = None, cache: Optional[HashCache] = None,
+                hash_resized: bool = True) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (path, FileInfo-dict) as files are hashed. Work is fed to the pool
+    as the walk proceeds with a bounded number of batches in flight, so
+    memory does not grow with the size of the tree.
+    """
+    roots = _resolve_roots(paths)
+    excl_re = _compile_excludes(excludes)
+
+    def to_hash() -> Iterator[Optional[Tuple[str, os.stat_result]]]:
+        for entry in _iter_entries(roots, excl_re, follow_symlinks, ignore_hidden):
+            if len(done) >= SMALL_FILE_BATCH:
+                yield None  # let the caller drain done even if nothing is left to hash
+            fpath = os.fspath(entry)
+            try:
+                st = entry.stat() if isinstance(entry, os.DirEntry) else os.stat(entry)
+            except OSError:
+                continue
+            known_hash = None
+            if prev is not None:
+                old = prev.get(fpath)
+                if old is not None and old.get("size") == st.st_size and \
+                        _mtime_matches(old.get("mtime_ns"), st.st_mtime_ns, "mtime_ns_precision" in old) and \
+                        old.get("ino") == st.st_ino and old.get("ctime_ns") == st.st_ctime_ns:
+                    # same inode, not written since: reuse the recorded hash without reading the file.
+                    # ctime is required because mtime can be set back by the file's owner; entries
+                    # without it (older baselines) are always rehashed
+                    known_hash = old["hash"]
+                elif old is not None and not hash_resized and old.get("size") != st.st_size:
+                    # already known to be modified; leave the hash unset rather than read the file
+                    info = FileInfo.from_stat(st, None, track_perms=track_perms)
+                    done.append((fpath, asdict(info)))
                     continue
-                try:
-                    if fpath.is_file():
-                        yield fpath
-                except OSError:
-                    # permission or race; skip
+            if known_hash is None and cache is not None:
+                known_hash = cache.get(HashCache.key(st, algorithm))
+            if known_hash is not None:
+                info = FileInfo.from_stat(st, known_hash, track_perms=track_perms)
+                done.append((fpath, asdict(info)))
+                continue
+            yield fpath, st
+
+    def hashed(batch, results) -> List[Tuple[str, Dict]]:
+        if cache is not None:
+            stats = dict(batch)
+            for fpath, info in results:
+                cache.put(HashCache.key(stats[fpath], algorithm), info["hash"])
+        return results
+
+    done: List[Tuple[str, Dict]] = []  # entries resolved without hashing, drained as we go
+    if workers is None:
+        workers = _default_workers()
+    if workers <= 1:
+        for batch in _batches(to_hash()):
+            yield from done
+            done.clear()
+            if batch:
+                yield from hashed(batch, _hash_batch(batch, algorithm, track_perms))
+    else:
+        pool_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool_cls(max_workers=workers) as ex:
+            pending = {}
+            for batch in _batches(to_hash()):
+                yield from done
+                done.clear()
+                if not batch:
                     continue
+                pending[ex.submit(_hash_batch, batch, algorithm, track_perms)] = batch
+                if len(pending) >= workers * 4:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        yield from hashed(pending.pop(fut), fut.result())
+            for fut in wait(pending).done:
+                yield from hashed(pending[fut], fut.result())
+    yield from done
+
+    if cache is not None:
+        cache.flush()
+
+
+def _build_state(paths: List[Path], excludes: List[str], algorithm: str, follow_symlinks: bool,
+                 ignore_hidden: bool, track_perms: bool, workers: Optional[int], use_processes: bool,
+                 prev: Optional[Dict[str, Dict]] = None, cache: Optional[HashCache] = None,
+                 hash_resized: bool = True) -> Dict[str, Dict]:
+    return dict(_iter_state(paths, excludes, algorithm, follow_symlinks, ignore_hidden, track_perms,
+                            workers, use_processes, prev=prev, cache=cache, hash_resized=hash_resized))
 
 
 def build_baseline(paths: List[Path], excludes: List[str], algorithm: str, follow_symlinks: bool,
-                   ignore_hidden: bool, track_perms: bool = False) -> Dict[str, Dict]:
-    roots = [p.resolve() for p in paths]
-    baseline: Dict[str, Dict] = {}
-    for fpath in iter_files(roots, excludes, follow_symlinks, ignore_hidden):
+                   ignore_hidden: bool, track_perms: bool = False, workers: Optional[int] = None,
+                   use_processes: bool = False, cache: Optional[HashCache] = None) -> Dict[str, Dict]:
+    """
+    Hash every discovered file and return {path: FileInfo-dict}.
+
+    Files are hashed concurrently on a thread pool (or a process pool when
+    use_processes is set); workers <= 1 hashes sequentially. With a cache,
+    files whose inode metadata is unchanged since they were last hashed are
+    not read again.
+    """
+    return _build_state(paths, excludes, algorithm, follow_symlinks, ignore_hidden, track_perms,
+                        workers, use_processes, cache=cache)
+
+
+def build_incremental(prev: Dict[str, Dict], paths: List[Path], excludes: List[str], algorithm: str,
+                      follow_symlinks: bool, ignore_hidden: bool, track_perms: bool = False,
+                      workers: Optional[int] = None, use_processes: bool = False,
+                      cache: Optional[HashCache] = None, hash_resized: bool = True) -> Dict[str, Dict]:
+    """
+    Like build_baseline, but files whose size and mtime match their entry in
+    prev keep the previous hash instead of being read and rehashed.
+
+    With hash_resized=False, files whose size differs from prev are not read
+    either and get hash None: diff_states reports them as modified from the
+    size alone. Use this only for a one-off comparison, since such a state
+    cannot serve as a baseline itself.
+    """
+    return _build_state(paths, excludes, algorithm, follow_symlinks, ignore_hidden, track_perms,
+                        workers, use_processes, prev=prev, cache=cache, hash_resized=hash_resized)
+
+
+def _json_dumps(value) -> str:
+    if orjson is not None:
         try:
-            info = FileInfo.from_path(fpath, algorithm, track_perms=track_perms)
-            baseline[str(fpath)] = asdict(info)
-        except (PermissionError, FileNotFoundError, OSError):
+            return orjson.dumps(value).decode()
+        except TypeError:
+            # non-UTF-8 filenames (surrogate-escaped str); the stdlib json can encode them
+            pass
+    return json.dumps(value)
+
+
+def _json_loads(raw: bytes):
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson rejects lone surrogate escapes, which is how the stdlib json
+            # writes non-UTF-8 filenames; let the stdlib parse those
+            pass
+    return json.loads(raw)
+
+
+def build_baseline_streaming(paths: List[Path], excludes: List[str], algorithm: str, follow_symlinks: bool,
+                             ignore_hidden: bool, out_path: Path, track_perms: bool = False,
+                             workers: Optional[int] = None, use_processes: bool = False,
+                             cache: Optional[HashCache] = None) -> int:
+    """
+    Like build_baseline, but write each entry to out_path as soon as it is
+    hashed instead of collecting the whole baseline in memory. The result is
+    a JSON object with one entry per line (keys unsorted) that load_json reads
+    as usual and iter_baseline can read incrementally. Returns the number of
+    entries written.
+    """
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    count = 0
+    # orjson emits non-ASCII as-is, and readers expect UTF-8 whatever the locale
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for fpath, info in _iter_state(paths, excludes, algorithm, follow_symlinks, ignore_hidden, track_perms,
+                                       workers, use_processes, cache=cache):
+            f.write(",\n" if count else "\n")
+            f.write(f"{_json_dumps(fpath)}: {_json_dumps(info)}")
+            count += 1
+        f.write("\n}\n")
+    os.replace(tmp_path, out_path)
+    return count
+
+
+def iter_baseline(path: Path) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (path, entry) pairs from a baseline without loading it whole when it
+    was written by build_baseline_streaming; other formats are loaded with
+    load_baseline and iterated.
+    """
+    with open(path, "rb") as f:
+        first = f.readline()
+        second = f.readline()
+        if first.strip() != b"{" or not second.startswith(b'"'):
+            yield from load_baseline(path).items()
+            return
+        line = second
+        while line and line.strip() != b"}":
+            for fpath, entry in _json_loads(b"{" + line.rstrip().rstrip(b",") + b"}").items():
+                yield fpath, _migrate_entry(entry)
+            line = f.readline()
+
+
+def rehash_files(files: Iterable[str], paths: List[Path], excludes: List[str], algorithm: str,
+                 ignore_hidden: bool, track_perms: bool = False) -> Dict[str, Optional[Dict]]:
+    """
+    Rehash only the given files (e.g. from filesystem events). Returns
+    {path: FileInfo-dict}, with None for files that no longer exist or are no
+    longer regular files; paths outside the roots, hidden or excluded are
+    left out.
+    """
+    roots = _resolve_roots(paths)
+    prefixes = _root_prefixes(roots)
+    excl_re = _compile_excludes(excludes)
+    out: Dict[str, Optional[Dict]] = {}
+    for fpath in files:
+        if fpath not in roots and not fpath.startswith(tuple(prefixes)):
             continue
-    return baseline
+        if ignore_hidden and _is_hidden(fpath):
+            continue
+        if _should_exclude(fpath, os.path.basename(fpath), excl_re, prefixes):
+            continue
+        try:
+            st = os.stat(fpath)
+            if not stat.S_ISREG(st.st_mode):
+                out[fpath] = None
+                continue
+            out[fpath] = asdict(FileInfo.from_path(fpath, algorithm, track_perms=track_perms, st=st))
+        except (PermissionError, FileNotFoundError, OSError):
+            out[fpath] = None
+    return out
+
+
+class BaselineTable:
+    """
+    Column-oriented (struct-of-arrays) form of a {path: FileInfo-dict} state,
+    sorted by path. Hashes are stored as an (n, digest_size) uint8 matrix; a
+    missing mode or ctime_ns is stored as -1 and a missing ino as 0. mtime_tolerance_ns is above 1 when the mtimes were
+    migrated from float seconds. Requires numpy.
+    """
+
+    def __init__(self, paths, hashes, sizes, mtimes_ns, modes, inos=None, ctimes_ns=None,
+                 mtime_tolerance_ns: int = 1):
+        self.paths = paths
+        self.hashes = hashes
+        self.sizes = sizes
+        self.mtimes_ns = mtimes_ns
+        self.modes = modes
+        self.inos = inos if inos is not None else np.zeros(len(paths), dtype=np.uint64)
+        self.ctimes_ns = ctimes_ns if ctimes_ns is not None else np.full(len(paths), -1, dtype=np.int64)
+        self.mtime_tolerance_ns = mtime_tolerance_ns
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Dict]) -> "BaselineTable":
+        if np is None:
+            raise RuntimeError("BaselineTable requires the 'numpy' package")
+        paths = sorted(state)
+        hashes, sizes, mtimes_ns, modes, inos, ctimes_ns = [], [], [], [], [], []
+        migrated = False
+        for path in paths:
+            entry = state[path]
+            hashes.append(bytes.fromhex(entry["hash"]))
+            sizes.append(entry["size"])
+            mtimes_ns.append(entry["mtime_ns"])
+            mode = entry.get("mode")
+            modes.append(-1 if mode is None else mode)
+            inos.append(entry.get("ino") or 0)
+            ctime_ns = entry.get("ctime_ns")
+            ctimes_ns.append(-1 if ctime_ns is None else ctime_ns)
+            migrated = migrated or "mtime_ns_precision" in entry
+        width = len(hashes[0]) if hashes else 0
+        if any(len(h) != width for h in hashes):
+            raise ValueError("BaselineTable requires all hashes to use the same algorithm")
+        return cls(
+            paths=np.array(paths, dtype=str),
+            hashes=np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(len(hashes), width),
+            sizes=np.array(sizes, dtype=np.int64),
+            mtimes_ns=np.array(mtimes_ns, dtype=np.int64),
+            modes=np.array(modes, dtype=np.int32),
+            inos=np.array(inos, dtype=np.uint64),
+            ctimes_ns=np.array(ctimes_ns, dtype=np.int64),
+            mtime_tolerance_ns=MIGRATED_MTIME_TOLERANCE_NS if migrated else 1,
+        )
+
+    def to_state(self) -> Dict[str, Dict]:
+        state: Dict[str, Dict] = {}
+        raw = self.hashes.tobytes()
+        width = self.hashes.shape[1]
+        columns = zip(self.paths.tolist(), self.sizes.tolist(), self.mtimes_ns.tolist(), self.modes.tolist(),
+                      self.inos.tolist(), self.ctimes_ns.tolist())
+        for i, (path, size, mtime_ns, mode, ino, ctime_ns) in enumerate(columns):
+            info = FileInfo(hash=raw[i * width:(i + 1) * width].hex(), size=size, mtime_ns=mtime_ns,
+                            mode=None if mode < 0 else mode, ino=ino or None,
+                            ctime_ns=None if ctime_ns < 0 else ctime_ns)
+            state[path] = asdict(info)
+            if self.mtime_tolerance_ns > 1:
+                state[path]["mtime_ns_precision"] = "us"
+        return state
+
+    def save(self, out_path: Path) -> None:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "wb") as f:
+            np.savez(f, paths=self.paths, hashes=self.hashes, sizes=self.sizes, mtimes_ns=self.mtimes_ns,
+                     modes=self.modes, inos=self.inos, ctimes_ns=self.ctimes_ns,
+                     mtime_tolerance_ns=np.int64(self.mtime_tolerance_ns))
 
+    @classmethod
+    def load(cls, path: Path) -> "BaselineTable":
+        if np is None:
+            raise RuntimeError("Baseline is a numpy archive but the 'numpy' package is not installed")
+        with np.load(path, allow_pickle=False) as z:
+            if "mtimes_ns" in z:
+                mtimes_ns = z["mtimes_ns"]
+                tolerance = int(z["mtime_tolerance_ns"]) if "mtime_tolerance_ns" in z else 1
+            else:
+                # older archives stored float seconds
+                mtimes_ns = np.round(z["mtimes"] * 1e9).astype(np.int64)
+                tolerance = MIGRATED_MTIME_TOLERANCE_NS
+            return cls(z["paths"], z["hashes"], z["sizes"], mtimes_ns, z["modes"],
+                       inos=z["inos"] if "inos" in z else None, ctimes_ns=z["ctimes_ns"] if "ctimes_ns" in z else None,
+                       mtime_tolerance_ns=tolerance)
+
+
+def _diff_rows(h_prev, h_curr, pi, ci, sz_p, sz_c, md_p, md_c):
+    """Per common row (prev[pi[k]] vs curr[ci[k]]): (size or hash changed, mode changed)."""
+    content_changed = (sz_p[pi] != sz_c[ci]) | (h_prev[pi] != h_curr[ci]).any(axis=1)
+    meta = md_p[pi] != md_c[ci]
+    return content_changed, meta
+
+
+@functools.lru_cache(maxsize=None)
+def _diff_rows_jit():
+    """
+    Numba-compiled _diff_rows, or None without numba. numba is imported here
+    rather than at module level because its import alone costs more than a
+    small scan, and only large table diffs use it.
+    """
+    try:  # optional: pip install numba
+        from numba import njit, prange
+    except ImportError:  # pragma: no cover - depends on environment
+        return None
+
+    @njit(parallel=True, cache=True)
+    def diff_rows(h_prev, h_curr, pi, ci, sz_p, sz_c, md_p, md_c):  # pragma: no cover - compiled
+        n = pi.shape[0]
+        content_changed = np.zeros(n, dtype=np.bool_)
+        meta = np.zeros(n, dtype=np.bool_)
+        for k in prange(n):
+            p = pi[k]
+            c = ci[k]
+            meta[k] = md_p[p] != md_c[c]
+            if sz_p[p] != sz_c[c]:
+                content_changed[k] = True
+                continue
+            acc = 0
+            for j in range(h_prev.shape[1]):
+                acc |= h_prev[p, j] ^ h_curr[c, j]
+            content_changed[k] = acc != 0
+        return content_changed, meta
+
+    return diff_rows
+
+
+def diff_tables(prev: BaselineTable, curr: BaselineTable, strict_mtime: bool = False) -> Dict[str, List[str]]:
+    """Vectorized diff_states over two path-sorted BaselineTables."""
+    # locate each curr path in prev (and vice versa) by binary search on the sorted path columns
+    idx = np.searchsorted(prev.paths, curr.paths)
+    in_prev = idx < len(prev)
+    in_prev[in_prev] = prev.paths[idx[in_prev]] == curr.paths[in_prev]
+    rev = np.searchsorted(curr.paths, prev.paths)
+    in_curr = rev < len(curr)
+    in_curr[in_curr] = curr.paths[rev[in_curr]] == prev.paths[in_curr]
+
+    ci = np.nonzero(in_prev)[0]
+    pi = idx[ci]
+    if prev.hashes.shape[1] == curr.hashes.shape[1]:
+        h_prev, h_curr = prev.hashes, curr.hashes
+        if h_prev.shape[1] % 8 == 0:
+            # compare digests as 64-bit words rather than bytes
+            h_prev = np.ascontiguousarray(h_prev).view(np.uint64)
+            h_curr = np.ascontiguousarray(h_curr).view(np.uint64)
+        diff_rows = (_diff_rows_jit() if len(ci) >= NUMBA_MIN_ROWS else None) or _diff_rows
+        hash_changed, meta = diff_rows(h_prev, h_curr, pi, ci, prev.sizes, curr.sizes, prev.modes, curr.modes)
+    else:
+        # different digest sizes (algorithm changed): every common file differs
+        hash_changed = np.ones(len(ci), dtype=bool)
+        meta = prev.modes[pi] != curr.modes[ci]
+    if strict_mtime:
+        tolerance = max(prev.mtime_tolerance_ns, curr.mtime_tolerance_ns)
+        meta |= np.abs(prev.mtimes_ns[pi] - curr.mtimes_ns[ci]) >= tolerance
+    common = curr.paths[ci]
+
+    return {
+        "added": curr.paths[~in_prev].tolist(),
+        "removed": prev.paths[~in_curr].tolist(),
+        "modified": common[hash_changed].tolist(),
+        "meta_changed": common[~hash_changed & meta].tolist(),
+    }
 
-def diff_states(prev: Dict[str, Dict], curr: Dict[str, Dict], strict_mtime: bool = False) -> Dict[str, List[str]]:
-    prev_keys = set(prev.keys())
-    curr_keys = set(curr.keys())
 
-    added = sorted(curr_keys - prev_keys)
-    removed = sorted(prev_keys - curr_keys)
+def diff_states(prev: Union[Dict[str, Dict], BaselineTable], curr: Union[Dict[str, Dict], BaselineTable],
+                strict_mtime: bool = False) -> Dict[str, List[str]]:
+    if isinstance(prev, BaselineTable) or isinstance(curr, BaselineTable):
+        if not isinstance(prev, BaselineTable):
+            prev = BaselineTable.from_state(prev)
+        if not isinstance(curr, BaselineTable):
+            curr = BaselineTable.from_state(curr)
+        return diff_tables(prev, curr, strict_mtime=strict_mtime)
+
+    # set algebra on the key views runs in C; only the result lists get sorted
+    added = sorted(curr.keys() - prev.keys())
+    removed = sorted(prev.keys() - curr.keys())
     modified = []
     meta_changed = []
 
-    for path in sorted(prev_keys & curr_keys):
+    for path in prev.keys() & curr.keys():
         p = prev[path]
         c = curr[path]
-        if p["hash"] != c["hash"]:
+        if p == c:
+            # identical entries (the common case) need no field-by-field checks
+            continue
+        # a size change implies a content change, so it is decided before comparing hashes
+        # (and holds even when curr skipped hashing a resized file)
+        if p.get("size") != c.get("size") or p["hash"] != c["hash"]:
             modified.append(path)
         else:
             # same content; check metadata drift
-            if p.get("size") != c.get("size") or (strict_mtime and p.get("mtime") != c.get("mtime")) or (p.get("mode") != c.get("mode")):
+            approx = "mtime_ns_precision" in p or "mtime_ns_precision" in c
+            if (strict_mtime and not _mtime_matches(p.get("mtime_ns"), c.get("mtime_ns"), approx)) or \
+                    (p.get("mode") != c.get("mode")):
                 meta_changed.append(path)
 
+    modified.sort()
+    meta_changed.sort()
     return {
         "added": added,
         "removed": removed,
@@ -156,13 +849,54 @@ def diff_states(prev: Dict[str, Dict], curr: Dict[str, Dict], strict_mtime: bool
 
 def save_json(data: Dict, out_path: Path) -> None:
     out_path.parent.mkdir(parents=True, exist_ok=True)
+    if orjson is not None:
+        try:
+            out_path.write_bytes(orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2))
+            return
+        except TypeError:
+            # non-UTF-8 filenames (surrogate-escaped str); the stdlib json can encode them
+            pass
     with open(out_path, "w") as f:
         json.dump(data, f, indent=2, sort_keys=True)
 
 
+def _migrate_entry(entry: Dict) -> Dict:
+    # baselines before mtime_ns stored float seconds under "mtime"; the marker makes
+    # comparisons against them tolerate the float's rounding (see _mtime_matches)
+    if "mtime" in entry:
+        entry["mtime_ns"] = round(entry.pop("mtime") * 1e9)
+        entry["mtime_ns_precision"] = "us"
+    return entry
+
+
+def _migrate_state(state: Dict[str, Dict]) -> Dict[str, Dict]:
+    for entry in state.values():
+        _migrate_entry(entry)
+    return state
+
+
 def load_json(path: Path) -> Dict:
-    with open(path, "r") as f:
-        return json.load(f)
+    return _migrate_state(_json_loads(Path(path).read_bytes()))
+
+
+def save_msgpack(data: Dict, out_path: Path) -> None:
+    if msgpack is None:
+        raise RuntimeError("Binary baselines require the 'msgpack' package")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    # surrogateescape writes non-UTF-8 filenames back as their original bytes
+    out_path.write_bytes(msgpack.packb(data, use_bin_type=True, unicode_errors="surrogateescape"))
+
+
+def load_baseline(path: Path) -> Dict:
+    """Load a baseline written by save_json, save_msgpack or BaselineTable.save, detected from its first bytes."""
+    raw = Path(path).read_bytes()
+    if raw[:4] == b"PK\x03\x04":
+        return BaselineTable.load(path).to_state()
+    if raw[:1] in (b"{", b"") or raw[:1].isspace():
+        return _migrate_state(_json_loads(raw))
+    if msgpack is None:
+        raise RuntimeError("Baseline looks binary but the 'msgpack' package is not installed")
+    return _migrate_state(msgpack.unpackb(raw, raw=False, unicode_errors="surrogateescape"))
 
 
 def load_config(cfg_path: Path) -> Dict:
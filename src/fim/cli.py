@@ -12,13 +12,25 @@ from pathlib import Path
 
 from .monitor import (
     build_baseline,
+    build_incremental,
+    build_baseline_streaming,
+    BaselineTable,
+    HashCache,
     load_config,
     save_json,
-    load_json,
+    save_msgpack,
+    load_baseline,
     diff_states,
     configure_logging,
+    recommend_algorithm,
+    rehash_files,
 )
 
+try:  # optional: pip install watchdog
+    from .watcher import watch_changes
+except ImportError:  # pragma: no cover - depends on environment
+    watch_changes = None
+
 
 def _parse_args(argv):
     p = argparse.ArgumentParser(prog="fim", description="File Integrity Monitor (baseline, scan, watch)")
@@ -28,29 +40,60 @@ def _parse_args(argv):
     p.add_argument("--json", action="store_true", help="Emit JSON output instead of human-readable")
     p.add_argument("--strict-mtime", action="store_true", help="Treat mtime drift as a change even when hash matches")
     p.add_argument("--track-perms", action="store_true", help="Track and compare UNIX permission bits (mode)")
+    p.add_argument("--binary-baseline", action="store_true",
+                   help="Write the baseline as msgpack, or as a numpy archive if the path ends in .npz "
+                        "(requires msgpack/numpy; scan/watch detect the format)")
+    p.add_argument("--rehash-all", action="store_true",
+                   help="Rehash every file on scan/watch instead of reusing hashes of files whose size and mtime are unchanged")
+    p.add_argument("--cache-path", type=str, default=None,
+                   help="SQLite hash cache reused across runs for files whose inode metadata is unchanged")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Number of parallel hashing workers (default: 2x CPU count; 1 disables parallelism)")
+    p.add_argument("--pool", choices=("thread", "process"), default="thread",
+                   help="Worker pool type used for hashing (default: thread)")
 
     sub = p.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("baseline", help="Build/overwrite baseline with current file state")
+    base = sub.add_parser("baseline", help="Build/overwrite baseline with current file state")
+    base.add_argument("--stream", action="store_true",
+                      help="Write JSON entries as files are hashed (lower memory; keys are not sorted)")
 
     scan = sub.add_parser("scan", help="Scan and compare against baseline once")
     # no extra flags
 
     watch = sub.add_parser("watch", help="Continuously scan on an interval")
-    watch.add_argument("--interval", type=int, default=15, help="Polling interval seconds (default: 15)")
+    watch.add_argument("--interval", type=int, default=15,
+                       help="Polling interval seconds; with watchdog, seconds between forced full rescans (default: 15)")
+    watch.add_argument("--poll", action="store_true", help="Poll even when watchdog is installed")
 
     return p.parse_args(argv)
 
 
-def _state_from_config(cfg, track_perms=False):
+def _state_from_config(cfg, args, prev=None, out_path=None, hash_resized=True):
+    """
+    Build the current state from cfg. With prev, reuse unchanged hashes; with
+    out_path, stream entries to that file and return the entry count instead.
+    """
     paths = [Path(p) for p in cfg["paths"]]
     excludes = cfg.get("excludes", [])
     algorithm = cfg.get("algorithm", "sha256")
     follow_symlinks = cfg.get("follow_symlinks", False)
     ignore_hidden = cfg.get("ignore_hidden", True)
 
-    state = build_baseline(paths, excludes, algorithm, follow_symlinks, ignore_hidden, track_perms=track_perms)
-    return state
+    cache = HashCache(Path(args.cache_path)) if args.cache_path else None
+    kwargs = dict(track_perms=args.track_perms, workers=args.workers, use_processes=(args.pool == "process"),
+                  cache=cache)
+    try:
+        if out_path is not None:
+            return build_baseline_streaming(paths, excludes, algorithm, follow_symlinks, ignore_hidden, out_path,
+                                            **kwargs)
+        if prev is not None:
+            return build_incremental(prev, paths, excludes, algorithm, follow_symlinks, ignore_hidden,
+                                     hash_resized=hash_resized, **kwargs)
+        return build_baseline(paths, excludes, algorithm, follow_symlinks, ignore_hidden, **kwargs)
+    finally:
+        if cache is not None:
+            cache.close()
 
 
 def _print_or_json(result, as_json=False):
@@ -75,6 +118,17 @@ def _exit_code(result) -> int:
     return 2 if changed else 0
 
 
+def _report_watch(result, args, logger) -> bool:
+    if any(result.values()):
+        _print_or_json(result, as_json=args.json)
+        logger.warning("Changes detected: %s", {k: len(v) for k, v in result.items()})
+        return True
+    if not args.json:
+        print(".", end="", flush=True)
+    logger.info("No changes detected")
+    return False
+
+
 def main(argv=None):
     args = _parse_args(sys.argv[1:] if argv is None else argv)
 
@@ -90,9 +144,33 @@ def main(argv=None):
         print(f"Failed to read config: {e}", file=sys.stderr)
         return 1
 
+    suggestion = recommend_algorithm(cfg.get("algorithm", "sha256"))
+    if suggestion:
+        logger.info("CPU has no SHA extensions; \"algorithm\": \"%s\" in the config would hash faster", suggestion)
+
+    if args.cmd == "baseline" and args.stream and args.binary_baseline:
+        print("--stream writes a JSON baseline and cannot be combined with --binary-baseline", file=sys.stderr)
+        return 1
+
+    if args.cmd == "baseline" and args.stream:
+        count = _state_from_config(cfg, args, out_path=base_path)
+        if not args.json:
+            print(f"Wrote baseline to {base_path}")
+        logger.info("Baseline created at %s with %d files", base_path, count)
+        return 0
+
     if args.cmd == "baseline":
-        state = _state_from_config(cfg, track_perms=args.track_perms)
-        save_json(state, base_path)
+        state = _state_from_config(cfg, args)
+        try:
+            if args.binary_baseline and base_path.suffix == ".npz":
+                BaselineTable.from_state(state).save(base_path)
+            elif args.binary_baseline:
+                save_msgpack(state, base_path)
+            else:
+                save_json(state, base_path)
+        except RuntimeError as e:
+            print(f"Failed to write baseline: {e}", file=sys.stderr)
+            return 1
         if not args.json:
             print(f"Wrote baseline to {base_path}")
         logger.info("Baseline created at %s with %d files", base_path, len(state))
@@ -100,11 +178,12 @@ def main(argv=None):
 
     if args.cmd == "scan":
         try:
-            prev = load_json(base_path)
+            prev = load_baseline(base_path)
         except Exception as e:
             print(f"Failed to read baseline: {e}", file=sys.stderr)
             return 1
-        curr = _state_from_config(cfg, track_perms=args.track_perms)
+        # scan's state is discarded afterwards, so resized files need not be hashed
+        curr = _state_from_config(cfg, args, prev=None if args.rehash_all else prev, hash_resized=False)
         result = diff_states(prev, curr, strict_mtime=args.strict_mtime)
         _print_or_json(result, as_json=args.json)
         code = _exit_code(result)
@@ -117,24 +196,43 @@ def main(argv=None):
     if args.cmd == "watch":
         # Initial load
         try:
-            prev = load_json(base_path)
+            prev = load_baseline(base_path)
         except Exception as e:
             print(f"Failed to read baseline: {e}", file=sys.stderr)
             return 1
         interval = max(1, args.interval)
+        if watch_changes is not None and not args.poll:
+            if not args.json:
+                print(f"Watching for filesystem events (full rescan every {interval}s). Press Ctrl+C to stop.")
+            roots = [str(Path(p).resolve()) for p in cfg["paths"]]
+            for changed in watch_changes(roots, interval):
+                if changed is None:
+                    curr = _state_from_config(cfg, args, prev=None if args.rehash_all else prev)
+                    result = diff_states(prev, curr, strict_mtime=args.strict_mtime)
+                else:
+                    updates = rehash_files(changed, [Path(p) for p in cfg["paths"]], cfg.get("excludes", []),
+                                           cfg.get("algorithm", "sha256"), cfg.get("ignore_hidden", True),
+                                           track_perms=args.track_perms)
+                    if not updates:
+                        # only excluded/hidden paths changed (e.g. our own log file); reporting
+                        # would write the log and trigger another event
+                        continue
+                    sub_prev = {p: prev[p] for p in updates if p in prev}
+                    sub_curr = {p: info for p, info in updates.items() if info is not None}
+                    result = diff_states(sub_prev, sub_curr, strict_mtime=args.strict_mtime)
+                    curr = {p: info for p, info in prev.items() if p not in updates}
+                    curr.update(sub_curr)
+                if _report_watch(result, args, logger):
+                    prev = curr  # update baseline in-memory; do not auto-write file
+            return 0
+
         if not args.json:
             print(f"Watching every {interval}s. Press Ctrl+C to stop.")
         while True:
-            curr = _state_from_config(cfg, track_perms=args.track_perms)
+            curr = _state_from_config(cfg, args, prev=None if args.rehash_all else prev)
             result = diff_states(prev, curr, strict_mtime=args.strict_mtime)
-            if any(result.values()):
-                _print_or_json(result, as_json=args.json)
-                logger.warning("Changes detected: %s", {k: len(v) for k, v in result.items()})
+            if _report_watch(result, args, logger):
                 prev = curr  # update baseline in-memory; do not auto-write file
-            else:
-                if not args.json:
-                    print(".", end="", flush=True)
-                logger.info("No changes detected")
             time.sleep(interval)
 
     return 0
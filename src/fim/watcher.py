@@ -0,0 +1,95 @@
+"""
+Event-driven change notification for watch mode, built on ``watchdog``
+(inotify, FSEvents or ReadDirectoryChangesW depending on the platform).
+
+Importing this module raises ImportError when watchdog is not installed.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import time
+from typing import Iterator, List, Optional, Set
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+DEBOUNCE = 0.2  # seconds to keep collecting events after the first one arrives
+MAX_BATCH = 10_000  # paths after which a batch is yielded without waiting out DEBOUNCE
+
+# Only content/namespace changes; open/close events would fire on our own reads.
+_FILE_EVENTS = ("created", "modified", "deleted", "moved")
+
+_RESCAN = object()
+
+
+class _QueueHandler(FileSystemEventHandler):
+    def __init__(self, q: "queue.Queue"):
+        super().__init__()
+        self._q = q
+
+    def on_any_event(self, event) -> None:
+        if event.event_type not in _FILE_EVENTS:
+            return
+        if event.is_directory:
+            # a directory modification just mirrors its children's events; a created, deleted
+            # or moved directory may hide per-file events, so ask for a full rescan
+            if event.event_type != "modified":
+                self._q.put(_RESCAN)
+            return
+        self._q.put(os.fsdecode(event.src_path))
+        dest = getattr(event, "dest_path", "")
+        if dest:
+            self._q.put(os.fsdecode(dest))
+
+
+def watch_changes(roots: List[str], interval: int) -> Iterator[Optional[Set[str]]]:
+    """
+    Yield sets of file paths reported changed under roots, or None when a full
+    rescan is due: every interval seconds whether or not events arrive, or
+    after a directory was created, removed or moved. A batch is yielded at
+    most DEBOUNCE seconds after its first event, so a file that changes
+    constantly cannot hold back reporting.
+    """
+    q: "queue.Queue" = queue.Queue()
+    handler = _QueueHandler(q)
+    observer = Observer()
+    for root in roots:
+        if os.path.isdir(root):
+            observer.schedule(handler, root, recursive=True)
+        elif os.path.isdir(os.path.dirname(root)):
+            observer.schedule(handler, os.path.dirname(root), recursive=False)
+    observer.start()
+    try:
+        next_rescan = time.monotonic() + interval
+        while True:
+            now = time.monotonic()
+            if now >= next_rescan:
+                next_rescan = now + interval
+                yield None
+                continue
+            try:
+                item = q.get(timeout=next_rescan - now)
+            except queue.Empty:
+                continue
+
+            batch = {item}
+            flush_at = time.monotonic() + DEBOUNCE
+            while len(batch) < MAX_BATCH:
+                remaining = flush_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.add(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if _RESCAN in batch:
+                next_rescan = time.monotonic() + interval
+                yield None
+            else:
+                yield batch
+    finally:
+        observer.stop()
+        observer.join()
@@ -1,9 +1,16 @@
+import hashlib
+import importlib.util
+import json
 import os
 import tempfile
+import threading
+import time
 import unittest
 from pathlib import Path
+from unittest import mock
 
-from fim.monitor import build_baseline, diff_states
+from fim import cli, monitor
+from fim.monitor import build_baseline, build_incremental, diff_states
 
 
 class TestFIM(unittest.TestCase):
@@ -25,6 +32,373 @@ class TestFIM(unittest.TestCase):
             result = diff_states(baseline, current)
             self.assertIn(str(f1), result["modified"])
 
+    def test_parallel_matches_sequential(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            for i in range(20):
+                (root / f"f{i}.txt").write_text("x" * i)
+
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+            seq = build_baseline([root], workers=1, **kwargs)
+            par = build_baseline([root], workers=4, **kwargs)
+            self.assertEqual(len(seq), 20)
+            self.assertEqual(seq, par)
+
+    def test_incremental_reuses_unchanged_hashes(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            f1 = root / "a.txt"
+            f2 = root / "b.txt"
+            f1.write_text("hello")
+            f2.write_text("world")
+
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+            prev = build_baseline([root], **kwargs)
+            prev[str(f1)]["hash"] = "cached"
+
+            f2.write_text("world!")
+            curr = build_incremental(prev, [root], **kwargs)
+            self.assertEqual(curr[str(f1)]["hash"], "cached")
+            self.assertIn(str(f2), diff_states(prev, curr)["modified"])
+
+            scan = build_incremental(prev, [root], hash_resized=False, **kwargs)
+            self.assertIsNone(scan[str(f2)]["hash"])
+            self.assertEqual(diff_states(prev, scan)["modified"], [str(f2)])
+
+    def test_incremental_detects_rewrite_with_restored_mtime(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            f1 = root / "a.txt"
+            f1.write_text("hello")
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+            prev = build_baseline([root], **kwargs)
+
+            st = os.stat(f1)
+            time.sleep(0.01)  # let ctime move on filesystems with coarse timestamps
+            f1.write_text("HELLO")
+            os.utime(f1, ns=(st.st_atime_ns, st.st_mtime_ns))
+            curr = build_incremental(prev, [root], **kwargs)
+            self.assertEqual(diff_states(prev, curr)["modified"], [str(f1)])
+
+    def test_hash_file_large_file_path(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / "big.bin"
+            data = os.urandom(3 * 1024 * 1024 + 17)  # spans several CHUNK_SIZE reads
+            path.write_bytes(data)
+            with mock.patch.object(monitor, "LARGE_FILE_SIZE", 1024), \
+                    mock.patch.object(monitor, "_hash_readinto", wraps=monitor._hash_readinto) as readinto:
+                self.assertEqual(monitor.hash_file(path), hashlib.sha256(data).hexdigest())
+            readinto.assert_called_once()
+
+    def test_excludes(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            (root / "keep.txt").write_text("a")
+            (root / "skip.log").write_text("b")
+            (root / "build").mkdir()
+            (root / "build" / "out.txt").write_text("c")
+
+            baseline = build_baseline([root], excludes=["*.log", "build/*"], algorithm="sha256",
+                                      follow_symlinks=False, ignore_hidden=True)
+            self.assertEqual(sorted(baseline), [str(root.resolve() / "keep.txt")])
+
+    def test_hash_cache_skips_rehash(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / "data"
+            root.mkdir()
+            f1 = root / "a.txt"
+            f1.write_text("hello")
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+
+            with monitor.HashCache(Path(d) / "cache.db") as cache:
+                first = build_baseline([root], cache=cache, **kwargs)
+                cache.put(monitor.HashCache.key(os.stat(f1), "sha256"), "cached")
+            with monitor.HashCache(Path(d) / "cache.db") as cache:
+                second = build_baseline([root], cache=cache, **kwargs)
+
+            self.assertNotEqual(first[str(f1)]["hash"], "cached")
+            self.assertEqual(second[str(f1)]["hash"], "cached")
+
+    def test_hash_cache_pending_writes_stay_bounded(self):
+        class TrackingCache(monitor.HashCache):
+            peak = 0
+
+            def get(self, key):
+                try:
+                    return super().get(key)
+                finally:
+                    self.peak = max(self.peak, len(self._pending))
+
+            def put(self, key, file_hash):
+                super().put(key, file_hash)
+                self.peak = max(self.peak, len(self._pending))
+
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / "data"
+            root.mkdir()
+            for i in range(100):
+                (root / f"f{i}.txt").write_text(str(i))
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True,
+                          out_path=Path(d) / "baseline.json")
+
+            for _ in range(2):  # cold, then warm
+                with TrackingCache(Path(d) / "cache.db", flush_entries=8) as cache:
+                    self.assertEqual(monitor.build_baseline_streaming([root], cache=cache, **kwargs), 100)
+                self.assertLessEqual(cache.peak, 8)
+
+    def test_rehash_files_subset(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d).resolve()
+            f1 = root / "a.txt"
+            f1.write_text("hello")
+            (root / "b.log").write_text("ignored")
+
+            updates = monitor.rehash_files([str(f1), str(root / "b.log"), str(root / "gone.txt")], [root],
+                                           excludes=["*.log"], algorithm="sha256", ignore_hidden=True)
+            self.assertEqual(sorted(updates), [str(f1), str(root / "gone.txt")])
+            self.assertIsNone(updates[str(root / "gone.txt")])
+
+    def test_streaming_baseline_round_trip(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / "data"
+            root.mkdir()
+            for i in range(5):
+                (root / f"f{i}.txt").write_text(str(i))
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+            out = Path(d) / "baseline.json"
+
+            count = monitor.build_baseline_streaming([root], out_path=out, **kwargs)
+            self.assertEqual(count, 5)
+            self.assertEqual(monitor.load_json(out), build_baseline([root], **kwargs))
+            self.assertEqual(dict(monitor.iter_baseline(out)), monitor.load_json(out))
+
+            (root / os.fsdecode(b"bad\xffname.txt")).write_text("x")
+            (root / "caf\u00e9 \u65e5\u672c.txt").write_text("y")
+            self.assertEqual(monitor.build_baseline_streaming([root], out_path=out, **kwargs), 7)
+            self.assertEqual(dict(monitor.iter_baseline(out)), build_baseline([root], **kwargs))
+
+            # overlapping roots: files under both are written once
+            (root / "sub").mkdir()
+            (root / "sub" / "s.txt").write_text("s")
+            count = monitor.build_baseline_streaming([root, root / "sub", root], out_path=out, **kwargs)
+            self.assertEqual(count, 8)
+            self.assertEqual(len(monitor.load_json(out)), 8)
+
+    def test_iter_state_drains_resolved_entries_during_walk(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            for i in range(200):
+                (root / f"f{i}.txt").write_text(str(i))
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+            prev = build_baseline([root], **kwargs)
+
+            walked = []
+            iter_entries = monitor._iter_entries
+
+            def counting(*args):
+                for entry in iter_entries(*args):
+                    walked.append(entry)
+                    yield entry
+
+            # every file is unchanged, so nothing is hashed; entries must still arrive before the walk ends
+            with mock.patch.object(monitor, "_iter_entries", counting):
+                states = monitor._iter_state([root], track_perms=False, workers=1, use_processes=False, prev=prev,
+                                             **kwargs)
+                next(states)
+                self.assertLess(len(walked), 200)
+                self.assertEqual(len(list(states)) + 1, 200)
+
+    def test_load_migrates_float_mtime(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / "old.json"
+            path.write_text('{"/x": {"hash": "ab", "size": 1, "mtime": 1700000000.5, "mode": null}}')
+            entry = monitor.load_json(path)["/x"]
+            self.assertNotIn("mtime", entry)
+            self.assertEqual(entry["mtime_ns"], 1700000000500000000)
+
+    def test_migrated_float_mtime_matches_within_a_microsecond(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / "data"
+            root.mkdir()
+            f1 = root / "a.txt"
+            f1.write_text("hello")
+            st = os.stat(f1)
+            path = Path(d) / "old.json"
+            # as written before mtime_ns: float seconds, which lose the low nanosecond digits
+            path.write_text(json.dumps({str(f1): {"hash": "cached", "size": st.st_size, "mtime": st.st_mtime,
+                                                  "mode": None}}))
+            prev = monitor.load_json(path)
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+
+            curr = build_incremental(prev, [root], **kwargs)
+            self.assertNotEqual(curr[str(f1)]["hash"], "cached")  # no ino/ctime_ns recorded: rehashed
+            prev[str(f1)]["hash"] = curr[str(f1)]["hash"]
+            self.assertEqual(diff_states(prev, curr, strict_mtime=True)["meta_changed"], [])
+            prev[str(f1)]["mtime_ns"] -= 5000
+            self.assertEqual(diff_states(prev, curr, strict_mtime=True)["meta_changed"], [str(f1)])
+
+    @unittest.skipIf(monitor.blake3 is None, "blake3 not installed")
+    def test_blake3_matches_reference(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            data = {f"f{i}.txt": os.urandom(100 + i) for i in range(4)}
+            for name, content in data.items():
+                (root / name).write_bytes(content)
+            # several small files go through the batched (io_uring) path, which uses hash_bytes
+            baseline = build_baseline([root], excludes=[], algorithm="blake3", follow_symlinks=False,
+                                      ignore_hidden=True, workers=1)
+            for name, content in data.items():
+                expected = monitor.blake3.blake3(content).hexdigest()
+                self.assertEqual(baseline[str(root / name)]["hash"], expected)
+                self.assertEqual(monitor.hash_file(root / name, "blake3"), expected)
+                self.assertEqual(monitor.hash_bytes(content, "blake3"), expected)
+
+    def test_sha_extensions_and_algorithm_recommendation(self):
+        def cpuinfo(flags):
+            return mock.patch.object(monitor, "open", mock.mock_open(read_data=f"processor\t: 0\nflags\t\t: {flags}\n"),
+                                     create=True)
+
+        with cpuinfo("fpu sse2 avx2 sha_ni"):
+            self.assertTrue(monitor.sha_extensions_available())
+            self.assertIsNone(monitor.recommend_algorithm("sha256"))
+        with cpuinfo("fpu sse2 avx2"), mock.patch.dict(monitor._HASHERS, {"blake3": object()}):
+            self.assertFalse(monitor.sha_extensions_available())
+            self.assertEqual(monitor.recommend_algorithm("sha256"), "blake3")
+            self.assertIsNone(monitor.recommend_algorithm("sha512"))
+        with cpuinfo("fpu sse2 avx2"), mock.patch.dict(monitor._HASHERS):
+            monitor._HASHERS.pop("blake3", None)
+            self.assertIsNone(monitor.recommend_algorithm("sha256"))
+        with mock.patch.object(monitor, "open", side_effect=OSError, create=True):
+            self.assertIsNone(monitor.sha_extensions_available())
+
+    def test_baseline_with_non_utf8_filename(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d) / "data"
+            root.mkdir()
+            (root / os.fsdecode(b"bad\xffname.txt")).write_text("x")
+            (root / "ok.txt").write_text("y")  # two small files go through the batched (io_uring) path
+            baseline = build_baseline([root], excludes=[], algorithm="sha256", follow_symlinks=False,
+                                      ignore_hidden=True, workers=1)
+            self.assertEqual(len(baseline), 2)
+
+            out = Path(d) / "baseline.json"
+            monitor.save_json(baseline, out)
+            self.assertEqual(monitor.load_baseline(out), baseline)
+            if monitor.msgpack is not None:
+                monitor.save_msgpack(baseline, out)
+                self.assertEqual(monitor.load_baseline(out), baseline)
+
+    @unittest.skipIf(monitor._io_uring is None or not os.path.isdir("/proc/self/fd"), "io_uring not available")
+    def test_io_uring_read_failure_closes_files(self):
+        with tempfile.TemporaryDirectory() as d:
+            files = []
+            for i in range(4):
+                (Path(d) / f"f{i}").write_text(str(i))
+                files.append((str(Path(d) / f"f{i}"), 1))
+            open_fds = len(os.listdir("/proc/self/fd"))
+            with mock.patch.object(monitor._io_uring.liburing, "io_uring_prep_read", side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    monitor._io_uring.read_files(files)
+            self.assertEqual(len(os.listdir("/proc/self/fd")), open_fds)
+
+    def test_watch_ignores_events_on_excluded_paths(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d).resolve()
+            (root / "a.txt").write_text("hello")
+            (root / "logs").mkdir()
+            log = root / "logs" / "changes.log"
+            log.write_text("")
+            cfg = root / "config.json"
+            cfg.write_text('{"paths": ["%s"], "excludes": ["logs/*", "*.json"]}' % root)
+            base = root / "baseline.json"
+            monitor.save_json(build_baseline([root], excludes=["logs/*", "*.json"], algorithm="sha256",
+                                             follow_symlinks=False, ignore_hidden=True), base)
+
+            with mock.patch.object(cli, "watch_changes", lambda roots, interval: iter([{str(log)}])), \
+                    mock.patch.object(cli, "_report_watch") as report:
+                code = cli.main(["--config", str(cfg), "--baseline", str(base), "--log-file", "", "--json",
+                                 "watch"])
+            self.assertEqual(code, 0)
+            report.assert_not_called()
+
+    @unittest.skipIf(importlib.util.find_spec("watchdog") is None, "watchdog not installed")
+    def test_watch_changes_reports_under_steady_events(self):
+        from fim import watcher
+
+        class ChattyObserver:
+            """Stands in for watchdog's Observer: reports a change to one file every 20 ms."""
+
+            def schedule(self, handler, path, recursive):
+                self.handler = handler
+
+            def start(self):
+                self.stopped = threading.Event()
+                event = mock.Mock(event_type="modified", is_directory=False, src_path="/data/chatty.txt",
+                                  dest_path="")
+                self.thread = threading.Thread(target=self._run, args=(event,), daemon=True)
+                self.thread.start()
+
+            def _run(self, event):
+                while not self.stopped.wait(0.02):
+                    self.handler.on_any_event(event)
+
+            def stop(self):
+                self.stopped.set()
+
+            def join(self):
+                self.thread.join()
+
+        with tempfile.TemporaryDirectory() as d, mock.patch.object(watcher, "Observer", ChattyObserver):
+            changes = watcher.watch_changes([d], interval=0.5)
+            seen = []
+            deadline = time.monotonic() + 1.6
+            for changed in changes:
+                seen.append(changed)
+                if time.monotonic() > deadline:
+                    break
+            changes.close()
+        self.assertIn({"/data/chatty.txt"}, seen)
+        self.assertGreaterEqual(seen.count(None), 2)
+
+    @unittest.skipIf(monitor.np is None, "numpy not installed")
+    def test_table_diff_matches_dict_diff(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            for name in ("a", "b", "c"):
+                (root / name).write_text(name)
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True)
+            prev = build_baseline([root], **kwargs)
+
+            (root / "a").write_text("changed")
+            (root / "b").unlink()
+            (root / "d").write_text("d")
+            curr = build_baseline([root], **kwargs)
+
+            table_prev = monitor.BaselineTable.from_state(prev)
+            self.assertEqual(table_prev.to_state(), prev)
+            self.assertEqual(diff_states(table_prev, monitor.BaselineTable.from_state(curr)),
+                             diff_states(prev, curr))
+
+    @unittest.skipIf(monitor.np is None or importlib.util.find_spec("numba") is None, "numba not installed")
+    def test_table_diff_numba_kernel(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            for name in ("a", "b", "c"):
+                (root / name).write_text(name)
+            kwargs = dict(excludes=[], algorithm="sha256", follow_symlinks=False, ignore_hidden=True,
+                          track_perms=True)
+            prev = build_baseline([root], **kwargs)
+
+            (root / "a").write_text("changed")
+            os.chmod(root / "b", 0o600)
+            curr = build_baseline([root], **kwargs)
+
+            with mock.patch.object(monitor, "NUMBA_MIN_ROWS", 0):
+                result = diff_states(monitor.BaselineTable.from_state(prev), monitor.BaselineTable.from_state(curr))
+            self.assertTrue(monitor._diff_rows_jit().signatures)  # the kernel was compiled and called
+            self.assertEqual(result, diff_states(prev, curr))
+            self.assertEqual(result["modified"], [str(root / "a")])
+
 
 if __name__ == "__main__":
     unittest.main()